@@ -1,14 +1,27 @@
 import netCDF4 as nc
 import numpy as np
 import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
 from matplotlib.widgets import RectangleSelector, TextBox, Button
+from matplotlib.offsetbox import AnchoredText
 import glob
+import io
 import re
 import os
 import sys
 
 np.set_printoptions(threshold=500)
 
+# One generator for every random draw; set ASF_SEED for reproducible edits
+_seed = os.environ.get('ASF_SEED')
+_rng = np.random.default_rng(int(_seed) if _seed else None)
+
+# .in file keys we need, as key = 'value' pairs
+_KV_RE = re.compile(r"(domname|dirter|dirglob)\s*=\s*['\"]([^'\"]+)['\"]")
+
+# landuse legend lines, as  <int> => <name>
+_LEGEND_RE = re.compile(r"^\s*(-?\d+)\s*=>\s*(.*\S)", re.MULTILINE)
+
 # Parse CLI args: positional .in file, and optional --apply x_min,y_min,x_max,y_max,new_val,percent
 in_file = None
 cli_applies = []
@@ -54,42 +67,84 @@ def resolve_path(p):
         return p
     return os.path.normpath(os.path.join(in_file_dir, p))
 
-# Parse domname from the .in file (format: domname = 'xxx',)
-match = re.search(r"domname\s*=\s*['\"]([^'\"]+)['\"]", content)
-if not match:
+# Parse domname, dirter and dirglob in one pass (format: domname = 'xxx',);
+# the first occurrence of each key wins
+kv = {}
+for m in _KV_RE.finditer(content):
+    kv.setdefault(m.group(1), m.group(2))
+
+if 'domname' not in kv:
     raise ValueError(f"Could not find domname in {in_file}")
 
-domname = match.group(1)
+domname = kv['domname']
 print(f"Found domname: {domname}")
 
-# Parse dirter and dirglob for the input directories
-dirter_match = re.search(r"dirter\s*=\s*['\"]([^'\"]+)['\"]", content)
-dirter = resolve_path(dirter_match.group(1) if dirter_match else './input')
+# Input directories
+dirter = resolve_path(kv.get('dirter', './input'))
 print(f"Using terrain directory (dirter): {dirter}")
 
-dirglob_match = re.search(r"dirglob\s*=\s*['\"]([^'\"]+)['\"]", content)
-dirglob = resolve_path(dirglob_match.group(1) if dirglob_match else dirter)
+dirglob = resolve_path(kv.get('dirglob', dirter))
 print(f"Using global directory (dirglob): {dirglob}")
 
 filename = os.path.join(dirter, f'{domname}_DOMAIN000.nc')
 print(f"Opening: {filename}")
 
+# Enlarge the HDF5 chunk cache so landuse is read and written back in one
+# pass over its chunks instead of cycling through the ~1 MiB default cache
+nc.set_chunk_cache(size=256 * 1024 * 1024, nelems=4133, preemption=0.75)
 data = nc.Dataset(filename, 'r+')
 landuse = data['landuse']
+landuse.set_var_chunk_cache(size=max(64 * 1024 * 1024, 2 * landuse.size * landuse.dtype.itemsize),
+                            nelems=509, preemption=0.75)
 
 legend_text = landuse.getncattr('legend')
-legend_dict = {}
-for line in legend_text.strip().split('\n'):
-    parts = line.split('=>')
-    legend_dict[int(parts[0].strip())] = parts[1].strip()
+legend_dict = {int(k): v for k, v in _LEGEND_RE.findall(legend_text)}
 
-landuse_data = landuse[:]
+# Class names indexed by value, for the per-mouse-move lookup in format_coord
+# (negative keys can't index it; format_coord falls back to legend_dict)
+LEGEND_LUT = np.full(max(256, max(legend_dict) + 1), 'Unknown', dtype=object)
+for k, v in legend_dict.items():
+    if k >= 0:
+        LEGEND_LUT[k] = v
 
 # Track all applied changes for replay command
 applied_changes = []
 
+def apply_patch(arr, ys, xs, idx, val):
+    """Set arr[ys[i], xs[i]] = val for every i in idx, as one vectorized store."""
+    arr[ys[idx], xs[idx]] = val
+
+# Union bounding box [y0, x0, y1, x1] of all edited cells; empty when clean
+dirty_bbox = []
+
+def mark_dirty(x_min, y_min, x_max, y_max):
+    """Grow dirty_bbox to cover the (clipped) region."""
+    y0, y1 = max(y_min, 0), min(y_max, H - 1)
+    x0, x1 = max(x_min, 0), min(x_max, W - 1)
+    if y0 > y1 or x0 > x1:
+        return
+    if dirty_bbox:
+        dirty_bbox[:] = [min(dirty_bbox[0], y0), min(dirty_bbox[1], x0),
+                         max(dirty_bbox[2], y1), max(dirty_bbox[3], x1)]
+    else:
+        dirty_bbox[:] = [y0, x0, y1, x1]
+
+def write_dirty():
+    """Write only the dirty hyperslab back to the file. Returns False if clean."""
+    if not dirty_bbox:
+        return False
+    y0, x0, y1, x1 = dirty_bbox
+    landuse[y0:y1 + 1, x0:x1 + 1] = landuse_data[y0:y1 + 1, x0:x1 + 1].astype(landuse.dtype, copy=False)
+    data.sync()
+    dirty_bbox.clear()
+    return True
+
 # --- Batch/CLI mode: apply --apply args and save without GUI ---
+# All specs are applied to one in-memory window covering their union, which
+# is read once and written back with a single hyperslab write and sync.
 if cli_applies:
+    n_rows, n_cols = landuse.shape
+    specs = []
     for spec in cli_applies:
         parts = spec.split(',')
         if len(parts) != 6:
@@ -98,59 +153,89 @@ if cli_applies:
         x_min, y_min, x_max, y_max = int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3])
         new_val = int(parts[4])
         percent = float(parts[5])
-
-        points = []
-        for row in range(y_min, y_max + 1):
-            for col in range(x_min, x_max + 1):
-                if 0 <= row < landuse_data.shape[0] and 0 <= col < landuse_data.shape[1]:
-                    points.append((row, col))
-
-        num_to_change = int(len(points) * percent / 100)
-        chosen = np.random.choice(len(points), num_to_change, replace=False)
-        for idx in chosen:
-            row, col = points[idx]
-            landuse_data[row, col] = new_val
+        specs.append((x_min, y_min, x_max, y_max, new_val, percent))
+
+    # Clip each box to the grid once: (y0, x0, y1, x1), empty if y0 > y1 or x0 > x1
+    boxes = [(max(y_min, 0), max(x_min, 0), min(y_max, n_rows - 1), min(x_max, n_cols - 1))
+             for x_min, y_min, x_max, y_max, _, _ in specs]
+    touched = [b for b in boxes if b[0] <= b[2] and b[1] <= b[3]]
+    if touched:
+        Y0, X0 = min(b[0] for b in touched), min(b[1] for b in touched)
+        Y1, X1 = max(b[2] for b in touched), max(b[3] for b in touched)
+        window = landuse[Y0:Y1 + 1, X0:X1 + 1]
+
+    for (x_min, y_min, x_max, y_max, new_val, percent), (y0, x0, y1, x1) in zip(specs, boxes):
+        num_to_change = 0
+        if y0 <= y1 and x0 <= x1:
+            sub = window[y0 - Y0:y1 - Y0 + 1, x0 - X0:x1 - X0 + 1]
+            num_to_change = int(sub.size * percent / 100)
+            idx = _rng.choice(sub.size, size=num_to_change, replace=False, shuffle=False)
+            sub.flat[idx] = new_val
 
         applied_changes.append((x_min, y_min, x_max, y_max, new_val, percent))
         print(f"Applied: region ({x_min},{y_min})-({x_max},{y_max}), "
               f"landuse={new_val} ({legend_dict.get(new_val,'?')}), {percent}% -> {num_to_change} points")
 
-    landuse[:] = landuse_data
-    data.sync()
+    if touched:
+        landuse[Y0:Y1 + 1, X0:X1 + 1] = window
+        data.sync()
     print(f"\nSaved changes to {filename}")
     sys.exit(0)
 
+# Hold the grid as uint8 when the classes fit, so redraws, histograms and
+# writeback move a quarter (or less) of the bytes; cast back on write
+landuse_data = landuse[:]
+if (min(legend_dict) >= 0 and max(legend_dict) < 256
+        and landuse_data.min() >= 0 and landuse_data.max() < 256):
+    landuse_data = np.asarray(landuse_data, dtype=np.uint8)
+H, W = landuse_data.shape
+
 # --- Interactive GUI mode ---
 fig, (ax, ax_legend) = plt.subplots(1, 2, figsize=(14, 8), gridspec_kw={'width_ratios': [3, 1]})
 plt.subplots_adjust(bottom=0.2, right=0.95, left=0.05)
-im = ax.imshow(landuse_data, cmap='gray', origin='lower')
+# One colour per legend class, indexed directly by a fixed BoundaryNorm;
+# nearest-neighbour without resampling avoids smoothing the class labels
+legend_keys = sorted(legend_dict)
+cmap = mcolors.ListedColormap(plt.cm.tab20(np.linspace(0, 1, len(legend_keys))))
+norm = mcolors.BoundaryNorm(legend_keys + [legend_keys[-1] + 1], ncolors=len(legend_keys))
+im = ax.imshow(landuse_data, cmap=cmap, norm=norm, origin='lower',
+               interpolation='nearest', resample=False)
 plt.colorbar(im, ax=ax)
 ax.set_title('Landuse Data')
 
 # Create legend panel
 ax_legend.axis('off')
 ax_legend.set_title('Landuse Legend', fontsize=12, fontweight='bold')
-legend_lines = []
-for k in sorted(legend_dict.keys()):
-    legend_lines.append(f"{k:3d} → {legend_dict[k]}")
-legend_str = '\n'.join(legend_lines)
-ax_legend.text(0.05, 0.95, legend_str, transform=ax_legend.transAxes,
-               fontsize=9, verticalalignment='top', fontfamily='monospace',
-               bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+keys = np.array(legend_keys)
+names = np.array([legend_dict[k] for k in legend_keys])
+legend_str = '\n'.join(np.char.add(np.char.mod('%3d → ', keys), names).tolist())
+# A single static artist; Apply blits only the image axes, so this block is
+# laid out on full redraws only
+legend_box = AnchoredText(legend_str, loc='upper left', frameon=True,
+                          prop=dict(family='monospace', size=9))
+legend_box.patch.set_boxstyle('round')
+legend_box.patch.set(facecolor='wheat', alpha=0.5)
+ax_legend.add_artist(legend_box)
 
 def format_coord(x, y):
     col, row = int(round(x)), int(round(y))
-    if 0 <= row < landuse_data.shape[0] and 0 <= col < landuse_data.shape[1]:
+    if 0 <= row < H and 0 <= col < W:
         val = int(landuse_data[row, col])
-        name = legend_dict.get(val, 'Unknown')
+        if 0 <= val < LEGEND_LUT.size:
+            name = LEGEND_LUT[val]
+        else:
+            name = legend_dict.get(val, 'Unknown')
         return f'x={x:.0f}, y={y:.0f}, {name}, {val}'
     return f'x={x:.0f}, y={y:.0f}'
 
 ax.format_coord = format_coord
 
-selected_points = []
 current_region = [None]  # [x_min, y_min, x_max, y_max]
 
+def _clip_region(x_min, y_min, x_max, y_max):
+    """Clip a selection box to the grid; returns (y0, y1, x0, x1), inclusive."""
+    return max(y_min, 0), min(y_max, H - 1), max(x_min, 0), min(x_max, W - 1)
+
 def on_select(eclick, erelease):
     x1, y1 = int(round(eclick.xdata)), int(round(eclick.ydata))
     x2, y2 = int(round(erelease.xdata)), int(round(erelease.ydata))
@@ -159,24 +244,59 @@ def on_select(eclick, erelease):
     y_min, y_max = min(y1, y2), max(y1, y2)
 
     current_region[0] = (x_min, y_min, x_max, y_max)
-    selected_points.clear()
     print(f"\nSelected region: ({x_min}, {y_min}) to ({x_max}, {y_max})")
-    for row in range(y_min, y_max + 1):
-        for col in range(x_min, x_max + 1):
-            if 0 <= row < landuse_data.shape[0] and 0 <= col < landuse_data.shape[1]:
-                val = int(landuse_data[row, col])
-                selected_points.append((row, col, val))
-
-    print(f"Total points: {len(selected_points)}")
-    values = set(p[2] for p in selected_points)
+    y0, y1, x0, x1 = _clip_region(x_min, y_min, x_max, y_max)
+    sub = landuse_data[y0:y1 + 1, x0:x1 + 1]
+    print(f"Total points: {sub.size}")
+    vals, counts = np.unique(sub, return_counts=True)
     print("Landuse types in selection:")
-    for v in sorted(values):
-        count = sum(1 for p in selected_points if p[2] == v)
+    for v, count in zip(vals.tolist(), counts.tolist()):
+        v = int(v)
         print(f"  {v} - {legend_dict.get(v, 'Unknown')}: {count} points")
 
+def build_selection():
+    """Return the current region's cells as an (n, 3) int32 array of (row, col, value)."""
+    # Every cell of the clipped box is in bounds
+    y0, y1, x0, x1 = _clip_region(*current_region[0])
+    h, w = max(y1 - y0 + 1, 0), max(x1 - x0 + 1, 0)
+    sel = np.empty((h * w, 3), dtype=np.int32)
+    sel[:, 0] = np.repeat(np.arange(y0, y0 + h, dtype=np.int32), w)
+    sel[:, 1] = np.tile(np.arange(x0, x0 + w, dtype=np.int32), h)
+    sel[:, 2] = landuse_data[y0:y0 + h, x0:x0 + w].ravel()
+    return sel
+
 selector = RectangleSelector(ax, on_select, useblit=True, button=[1],
                              interactive=True)
 
+# Blitting: keep a copy of the rendered main axes (refreshed after every full
+# draw, which includes resizes) so an Apply only repaints the image.
+_blit_bg = [None]
+
+def _cache_background(event):
+    _blit_bg[0] = fig.canvas.copy_from_bbox(ax.bbox)
+
+fig.canvas.mpl_connect('draw_event', _cache_background)
+
+def redraw_image():
+    """Repaint the landuse image, blitting just the main axes when possible."""
+    im.set_data(landuse_data)
+    if _blit_bg[0] is None or not fig.canvas.supports_blit:
+        fig.canvas.draw_idle()
+        return
+    fig.canvas.restore_region(_blit_bg[0])
+    ax.draw_artist(im)
+    _blit_bg[0] = fig.canvas.copy_from_bbox(ax.bbox)
+    # Hand the selector the repainted axes as its new background.  The
+    # rectangle is hidden while it copies, otherwise update_background() does a
+    # full canvas.draw() to keep it out of the copy.
+    shown = [a for a in selector.artists if a.get_visible()]
+    for a in shown:
+        a.set_visible(False)
+    selector.update_background(None)
+    for a in shown:
+        a.set_visible(True)
+    selector.update()
+
 ## Input fields for modifying landuse
 ax_landuse = plt.axes([0.15, 0.12, 0.2, 0.05])
 ax_percent = plt.axes([0.15, 0.05, 0.2, 0.05])
@@ -190,7 +310,7 @@ btn_save = Button(ax_save, 'Save')
 
 def apply_changes(event):
     global landuse_data
-    if not selected_points:
+    if current_region[0] is None:
         print("No points selected!")
         return
 
@@ -209,32 +329,36 @@ def apply_changes(event):
         print("Percent must be between 0 and 100.")
         return
 
-    num_to_change = int(len(selected_points) * percent / 100)
-    points_to_change = np.random.choice(len(selected_points), num_to_change, replace=False)
+    sel = build_selection()
+    if len(sel) == 0:
+        print("No points selected!")
+        return
 
-    for idx in points_to_change:
-        row, col, _ = selected_points[idx]
-        landuse_data[row, col] = new_val
+    num_to_change = int(len(sel) * percent / 100)
+    idx = _rng.choice(len(sel), size=num_to_change, replace=False, shuffle=False)
+    apply_patch(landuse_data, sel[:, 0], sel[:, 1], idx, new_val)
 
-    im.set_data(landuse_data)
-    fig.canvas.draw_idle()
+    redraw_image()
 
     x_min, y_min, x_max, y_max = current_region[0]
+    mark_dirty(x_min, y_min, x_max, y_max)
     applied_changes.append((x_min, y_min, x_max, y_max, new_val, percent))
     print(f"\nChanged {num_to_change} points to {new_val} - {legend_dict[new_val]}")
 
 btn_apply.on_clicked(apply_changes)
 
 def save_changes(event):
-    landuse[:] = landuse_data
-    data.sync()
-    print(f"\nSaved changes to {filename}")
+    if write_dirty():
+        print(f"\nSaved changes to {filename}")
+    else:
+        print("\nNo unsaved changes.")
 
     if applied_changes:
-        apply_args = ' '.join(
-            f'--apply {x_min},{y_min},{x_max},{y_max},{new_val},{percent:g}'
-            for x_min, y_min, x_max, y_max, new_val, percent in applied_changes
-        )
+        buf = io.StringIO()
+        w = buf.write
+        for x_min, y_min, x_max, y_max, new_val, percent in applied_changes:
+            w(f'--apply {x_min},{y_min},{x_max},{y_max},{new_val},{percent:g} ')
+        apply_args = buf.getvalue().rstrip()
         script = os.path.basename(sys.argv[0])
         print(f"\n--- Replay command ---")
         print(f"python3 {script} <other_file.in> {apply_args}")
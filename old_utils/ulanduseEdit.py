@@ -1,8 +1,13 @@
 import netCDF4 as nc
+try:
+    import h5netcdf.legacyapi as h5nc
+except ImportError:
+    h5nc = None
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 from matplotlib.widgets import RectangleSelector, TextBox, Button
+import argparse
 import glob
 import re
 import os
@@ -10,23 +15,52 @@ import sys
 
 np.set_printoptions(threshold=500)
 
+_rng = np.random.default_rng()
+
+# .in file fields (format: key = 'value',) and ensemble-member number prefix
+_DOMNAME_RE = re.compile(r"domname\s*=\s*['\"]([^'\"]+)['\"]")
+_DIRTER_RE  = re.compile(r"dirter\s*=\s*['\"]([^'\"]+)['\"]")
+_DIRGLOB_RE = re.compile(r"dirglob\s*=\s*['\"]([^'\"]+)['\"]")
+_NUM_RE     = re.compile(r'^(\d+)')
+
 # ──────────────────────────────────────────────────────────────────────────────
 # CLI argument parsing
 # ──────────────────────────────────────────────────────────────────────────────
-in_file = None
-cli_applies = []
+def _parse_spec(spec):
+    """argparse type for --apply: 'x_min,y_min,x_max,y_max,new_val,percent'."""
+    parts = spec.split(',')
+    if len(parts) != 6:
+        raise argparse.ArgumentTypeError(
+            f"expected x_min,y_min,x_max,y_max,new_val,percent: {spec}")
+    try:
+        x_min, y_min, x_max, y_max, new_val = map(int, parts[:5])
+        percent = float(parts[5])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"all fields must be numeric: {spec}")
+    if not 0 <= percent <= 100:
+        raise argparse.ArgumentTypeError(f"percent {percent} must be between 0 and 100")
+    return (x_min, y_min, x_max, y_max, new_val, percent)
+
 
+parser = argparse.ArgumentParser(description="Interactive / batch landuse editor.")
+parser.add_argument('in_file', nargs='?', help=".in file (default: the only *.in in cwd)")
+parser.add_argument('--apply', dest='cli_applies', action='append', default=[],
+                    type=_parse_spec, metavar='x_min,y_min,x_max,y_max,new_val,percent',
+                    help="apply a change non-interactively and save (repeatable)")
+# Specs may start with '-' (negative coordinates are clamped), which argparse
+# would take for an option: glue each '--apply' to its value first
 args = sys.argv[1:]
-i = 0
+argv, i = [], 0
 while i < len(args):
     if args[i] == '--apply' and i + 1 < len(args):
-        cli_applies.append(args[i + 1])
+        argv.append(f'--apply={args[i + 1]}')
         i += 2
-    elif not args[i].startswith('--'):
-        in_file = args[i]
-        i += 1
     else:
+        argv.append(args[i])
         i += 1
+cli_args = parser.parse_args(argv)
+in_file = cli_args.in_file
+cli_applies = cli_args.cli_applies
 
 # Find .in file
 if in_file:
@@ -57,27 +91,56 @@ def resolve_path(p, base_dir=None):
     return os.path.normpath(os.path.join(base_dir, p))
 
 
+def open_dataset(path, mode='r+'):
+    """
+    Open a NetCDF file through h5netcdf when it is installed (lower per-call
+    overhead) and netCDF4 otherwise.  h5netcdf only reads NetCDF-4/HDF5
+    files, so classic-format files (or a missing h5py backend) fall back to
+    netCDF4.
+    """
+    if h5nc is not None:
+        try:
+            return h5nc.Dataset(path, mode)
+        except (OSError, ImportError):
+            pass
+    return nc.Dataset(path, mode)
+
+
+def landuse_var(ds):
+    """
+    Return the 'landuse' variable of *ds* set up for raw reads: netCDF4's
+    auto-masking is switched off so slicing returns a plain ndarray instead of
+    building a masked copy (h5netcdf never masks).  Landuse has no fill
+    values, so nothing is lost, and writes round-trip the stored values
+    unchanged.
+    """
+    var = ds['landuse']
+    if hasattr(var, 'set_auto_mask'):
+        var.set_auto_mask(False)
+    return var
+
+
 # Parse domname
-match = re.search(r"domname\s*=\s*['\"]([^'\"]+)['\"]", content)
+match = _DOMNAME_RE.search(content)
 if not match:
     raise ValueError(f"Could not find domname in {in_file}")
 domname = match.group(1)
 print(f"Found domname: {domname}")
 
 # Parse dirter and dirglob
-dirter_match = re.search(r"dirter\s*=\s*['\"]([^'\"]+)['\"]", content)
+dirter_match = _DIRTER_RE.search(content)
 dirter = resolve_path(dirter_match.group(1) if dirter_match else './input')
 print(f"Using terrain directory (dirter): {dirter}")
 
-dirglob_match = re.search(r"dirglob\s*=\s*['\"]([^'\"]+)['\"]", content)
+dirglob_match = _DIRGLOB_RE.search(content)
 dirglob = resolve_path(dirglob_match.group(1) if dirglob_match else dirter)
 print(f"Using global directory (dirglob): {dirglob}")
 
 filename = os.path.join(dirter, f'{domname}_DOMAIN000.nc')
 print(f"Opening: {filename}")
 
-data = nc.Dataset(filename, 'r+')
-landuse = data['landuse']
+data = open_dataset(filename, 'r+')
+landuse = landuse_var(data)
 
 legend_text = landuse.getncattr('legend')
 legend_dict = {}
@@ -116,23 +179,30 @@ def scan_ensemble_members():
         fname = os.path.basename(f)
         if not fname[0].isdigit():
             continue
+        # Read line by line and stop once both fields are found; they sit
+        # near the top of the namelist
+        m = dt_m = None
         try:
             with open(f, 'r') as fp:
-                c = fp.read()
+                for line in fp:
+                    if m is None and 'domname' in line:
+                        m = _DOMNAME_RE.search(line)
+                    if dt_m is None and 'dirter' in line:
+                        dt_m = _DIRTER_RE.search(line)
+                    if m and dt_m:
+                        break
         except Exception:
             continue
 
-        m = re.search(r"domname\s*=\s*['\"]([^'\"]+)['\"]", c)
         if not m:
             continue
         dom = m.group(1)
 
         fdir = os.path.dirname(os.path.abspath(f))
-        dt_m = re.search(r"dirter\s*=\s*['\"]([^'\"]+)['\"]", c)
         dt = resolve_path(dt_m.group(1) if dt_m else './input', fdir)
 
         nc_file = os.path.join(dt, f'{dom}_DOMAIN000.nc')
-        num_m = re.match(r'^(\d+)', fname)
+        num_m = _NUM_RE.match(fname)
 
         members.append({
             'num':       int(num_m.group(1)) if num_m else 0,
@@ -168,15 +238,27 @@ else:
 # ──────────────────────────────────────────────────────────────────────────────
 # Shared helper  (defined before CLI block so both modes can use it)
 # ──────────────────────────────────────────────────────────────────────────────
-def _apply_region_to_array(lu_arr, x_min, y_min, x_max, y_max, new_val, percent):
+def _sample_flat(n_pts, n, rng):
+    """Draw n distinct flat indices in [0, n_pts) with `rng`."""
+    # Generator.choice switches to Floyd's algorithm for sparse draws (no
+    # length-n_pts buffer); order is irrelevant for a scatter, so skip the
+    # final shuffle
+    return rng.choice(n_pts, n, replace=False, shuffle=False)
+
+
+def _apply_region_to_array(lu_arr, x_min, y_min, x_max, y_max, new_val, percent,
+                           rng=_rng):
     """
     Randomly change `percent`% of the pixels in the rectangle
     (x_min,y_min)-(x_max,y_max) of lu_arr to new_val.
     Randomisation is independent per call — each ensemble member gets its
     own unique set of perturbed pixels.
+    `rng` defaults to the shared module Generator.
     Returns the number of pixels changed.
     Uses numpy flat indexing — no Python pixel loops.
     """
+    if percent <= 0:
+        return 0
     r0 = max(y_min, 0);  r1 = min(y_max, lu_arr.shape[0] - 1)
     c0 = max(x_min, 0);  c1 = min(x_max, lu_arr.shape[1] - 1)
     if r0 > r1 or c0 > c1:
@@ -184,33 +266,121 @@ def _apply_region_to_array(lu_arr, x_min, y_min, x_max, y_max, new_val, percent)
     n_rows = r1 - r0 + 1
     n_cols = c1 - c0 + 1
     n_pts  = n_rows * n_cols
+    if percent >= 100:
+        # Whole rectangle: a plain slice fill, no random indices needed
+        lu_arr[r0:r1 + 1, c0:c1 + 1] = new_val
+        return n_pts
     n = int(n_pts * percent / 100)
     if n == 0:
         return 0
-    flat_idx = np.random.choice(n_pts, n, replace=False)
-    lu_arr[r0 + flat_idx // n_cols, c0 + flat_idx % n_cols] = new_val
+    flat_idx = _sample_flat(n_pts, n, rng)
+    # Scatter through the rectangle's view: no row/col index temporaries
+    lu_arr[r0:r1 + 1, c0:c1 + 1].flat[flat_idx] = new_val
     return n
 
 
+def _apply_staged_merged(lu_arr, staged, rng=_rng):
+    """
+    Apply every staged change to lu_arr: full (100%) rectangles are filled as
+    slices, the sampled ones merged into a single scatter.  Their pixels are
+    drawn exactly as _apply_region_to_array would draw them (same order of rng
+    calls), converted to flat indices of lu_arr and concatenated.
+    Only valid when the clamped rectangles are pairwise disjoint — otherwise
+    the order of the writes matters — so returns None without touching lu_arr
+    when any two overlap.  lu_arr must be C-contiguous.
+    Returns the per-change pixel counts.
+    """
+    H, W = lu_arr.shape
+    rects = []
+    for (x_min, y_min, x_max, y_max, _, _) in staged:
+        rects.append((max(y_min, 0), min(y_max, H - 1), max(x_min, 0), min(x_max, W - 1)))
+    for i, (a0, a1, b0, b1) in enumerate(rects):
+        if a0 > a1 or b0 > b1:
+            continue
+        for (p0, p1, q0, q1) in rects[i + 1:]:
+            if a0 <= p1 and p0 <= a1 and b0 <= q1 and q0 <= b1:
+                return None
+
+    idx_parts, val_parts, counts = [], [], []
+    for (r0, r1, c0, c1), spec in zip(rects, staged):
+        new_val, percent = spec[4], spec[5]
+        n_cols = c1 - c0 + 1
+        n_pts  = (r1 - r0 + 1) * n_cols
+        if percent <= 0 or r0 > r1 or c0 > c1:
+            counts.append(0)
+            continue
+        if percent >= 100:
+            # Rectangles are disjoint, so a full one can be filled in place
+            lu_arr[r0:r1+1, c0:c1+1] = new_val
+            counts.append(n_pts)
+            continue
+        n = int(n_pts * percent / 100)
+        if n == 0:
+            counts.append(0)
+            continue
+        local = _sample_flat(n_pts, n, rng)
+        rows, cols = np.divmod(local, n_cols)
+        idx_parts.append((rows + r0) * W + (cols + c0))
+        val_parts.append(np.full(local.size, new_val, dtype=lu_arr.dtype))
+        counts.append(local.size)
+
+    if idx_parts:
+        lu_arr.flat[np.concatenate(idx_parts)] = np.concatenate(val_parts)
+    return counts
+
+
+# Union of the edited rectangles of landuse_data as (r0, r1, c0, c1),
+# None while the in-memory array matches the file
+dirty_bbox = [None]
+
+
+def _mark_dirty(x_min, y_min, x_max, y_max):
+    """Grow dirty_bbox to cover the rectangle, clamped to the data bounds."""
+    r0 = max(y_min, 0);  r1 = min(y_max, landuse_data.shape[0] - 1)
+    c0 = max(x_min, 0);  c1 = min(x_max, landuse_data.shape[1] - 1)
+    if r0 > r1 or c0 > c1:
+        return
+    if dirty_bbox[0] is not None:
+        d0, d1, e0, e1 = dirty_bbox[0]
+        r0, r1, c0, c1 = min(r0, d0), max(r1, d1), min(c0, e0), max(c1, e1)
+    dirty_bbox[0] = (r0, r1, c0, c1)
+
+
+def _chunk_aligned(var, r0, r1, c0, c1):
+    """
+    Expand an inclusive (r0, r1, c0, c1) box outward to the variable's chunk
+    boundaries.  HDF5 reads and rewrites whole chunks, so an aligned write
+    avoids read-modify-write of partially covered chunks.
+    """
+    chunks = var.chunking()
+    if isinstance(chunks, str) or not chunks:   # 'contiguous'
+        return r0, r1, c0, c1
+    ch_r, ch_c = chunks[-2], chunks[-1]
+    n_rows, n_cols = var.shape[-2], var.shape[-1]
+    return (r0 - r0 % ch_r, min(n_rows - 1, (r1 // ch_r + 1) * ch_r - 1),
+            c0 - c0 % ch_c, min(n_cols - 1, (c1 // ch_c + 1) * ch_c - 1))
+
+
+def _write_dirty():
+    """
+    Write the dirty part of landuse_data (chunk-aligned) back to the file and
+    sync.  Returns False if there was nothing to write.
+    """
+    if dirty_bbox[0] is None:
+        return False
+    r0, r1, c0, c1 = _chunk_aligned(landuse, *dirty_bbox[0])
+    landuse[r0:r1 + 1, c0:c1 + 1] = landuse_data[r0:r1 + 1, c0:c1 + 1]
+    data.sync()
+    dirty_bbox[0] = None
+    return True
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # CLI / batch mode
 # ──────────────────────────────────────────────────────────────────────────────
 if cli_applies:
-    for spec in cli_applies:
-        parts = spec.split(',')
-        if len(parts) != 6:
-            print(f"Invalid --apply spec (expected x_min,y_min,x_max,y_max,new_val,percent): {spec}")
-            sys.exit(1)
-        try:
-            x_min, y_min, x_max, y_max = int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3])
-            new_val = int(parts[4])
-            percent = float(parts[5])
-        except ValueError:
-            print(f"Invalid --apply values (all fields must be numeric): {spec}")
-            sys.exit(1)
-        if not 0 <= percent <= 100:
-            print(f"Invalid percent {percent} — must be between 0 and 100.")
-            sys.exit(1)
+    for (x_min, y_min, x_max, y_max, new_val, percent) in cli_applies:
+        # The legend comes from the domain file, so this check can't live in _parse_spec
         if new_val not in legend_dict:
             print(f"Invalid landuse value {new_val}. Valid: {sorted(legend_dict.keys())}")
             sys.exit(1)
@@ -218,14 +388,14 @@ if cli_applies:
         num_to_change = _apply_region_to_array(
             landuse_data, x_min, y_min, x_max, y_max, new_val, percent
         )
+        _mark_dirty(x_min, y_min, x_max, y_max)
 
         applied_changes.append((x_min, y_min, x_max, y_max, new_val, percent))
         print(f"Applied: region ({x_min},{y_min})-({x_max},{y_max}), "
               f"landuse={new_val} ({legend_dict.get(new_val, '?')}), "
               f"{percent}% -> {num_to_change} points")
 
-    landuse[:] = landuse_data
-    data.sync()
+    _write_dirty()
     print(f"\nSaved changes to {filename}")
     sys.exit(0)
 
@@ -366,6 +536,27 @@ ax_legend_panel.text(
 # ──────────────────────────────────────────────────────────────────────────────
 current_region = [None]   # holds (x_min, y_min, x_max, y_max)
 
+# Selections larger than this get a sampled class breakdown in on_select
+_HIST_FULL_MAX = 1_000_000
+_HIST_SAMPLE   = 50_000
+
+
+def _class_histogram(sub):
+    """
+    Return (values, counts) of the landuse classes present in *sub*.
+
+    Landuse codes are small non-negative integers, so a single bincount pass
+    replaces the sort behind np.unique.  Falls back to np.unique when the
+    values fall outside [0, max legend code] (fill values, empty legend).
+    """
+    top = max(legend_dict, default=-1)
+    raw = np.ma.getdata(sub)
+    if top < 0 or np.ma.is_masked(sub) or raw.min() < 0 or raw.max() > top:
+        return np.unique(sub, return_counts=True)
+    counts = np.bincount(raw.astype(np.intp).ravel(), minlength=top + 1)
+    vals = np.flatnonzero(counts)
+    return vals, counts[vals]
+
 
 def on_select(eclick, erelease):
     # xdata/ydata are None when the click lands outside the axes
@@ -388,15 +579,62 @@ def on_select(eclick, erelease):
         return
 
     sub = landuse_data[r0:r1 + 1, c0:c1 + 1]
-    print(f"Total points: {sub.size}")
-    print("Landuse types in selection:")
-    vals, counts = np.unique(sub, return_counts=True)
-    for v, cnt in zip(vals, counts):
-        print(f"  {int(v)} - {legend_dict.get(int(v), 'Unknown')}: {cnt} points")
+    lines = [f"Total points: {sub.size}"]
+    if sub.size > _HIST_FULL_MAX:
+        # Large drag: estimate the breakdown from a random sample so the
+        # callback never stalls the UI on a full-map selection
+        rows = _rng.integers(0, sub.shape[0], _HIST_SAMPLE)
+        cols = _rng.integers(0, sub.shape[1], _HIST_SAMPLE)
+        vals, counts = _class_histogram(sub[rows, cols])
+        scale = sub.size / _HIST_SAMPLE
+        lines.append(f"Landuse types in selection (estimated from {_HIST_SAMPLE} sampled points):")
+        lines += [f"  {int(v)} - {legend_dict.get(int(v), 'Unknown')}: "
+                  f"~{int(c * scale)} points ({100 * c / _HIST_SAMPLE:.1f}%)"
+                  for v, c in zip(vals, counts)]
+    else:
+        vals, counts = _class_histogram(sub)
+        lines.append("Landuse types in selection:")
+        lines += [f"  {int(v)} - {legend_dict.get(int(v), 'Unknown')}: {int(c)} points"
+                  for v, c in zip(vals, counts)]
+    # Build the whole summary first and emit it with a single write
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 selector = RectangleSelector(ax, on_select, useblit=True, button=[1], interactive=True)
 
+# Blitting: a copy of the rendered main axes, refreshed after every full draw
+# (which includes resizes), so an Apply repaints only the image instead of
+# the whole figure with its file and legend panels
+_blit_bg = [None]
+
+
+def _cache_background(event):
+    _blit_bg[0] = fig.canvas.copy_from_bbox(ax.bbox)
+
+
+fig.canvas.mpl_connect('draw_event', _cache_background)
+
+
+def redraw_image():
+    """Repaint the landuse image, blitting just the main axes when possible."""
+    im.set_data(landuse_data)
+    if _blit_bg[0] is None or not fig.canvas.supports_blit:
+        fig.canvas.draw_idle()
+        return
+    fig.canvas.restore_region(_blit_bg[0])
+    ax.draw_artist(im)
+    _blit_bg[0] = fig.canvas.copy_from_bbox(ax.bbox)
+    # Refresh the selector's cached background with the rectangle hidden so it
+    # is a plain copy (a visible one makes update_background() redraw the whole
+    # figure), then let the selector draw the rectangle back and blit.
+    shown = [a for a in selector.artists if a.get_visible()]
+    for a in shown:
+        a.set_visible(False)
+    selector.update_background(None)
+    for a in shown:
+        a.set_visible(True)
+    selector.update()
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Bottom controls
 #
@@ -452,8 +690,8 @@ def apply_changes(event):
 
     x_min, y_min, x_max, y_max = current_region[0]
     n = _apply_region_to_array(landuse_data, x_min, y_min, x_max, y_max, new_val, percent)
-    im.set_data(landuse_data)
-    fig.canvas.draw_idle()
+    _mark_dirty(x_min, y_min, x_max, y_max)
+    redraw_image()
 
     applied_changes.append((x_min, y_min, x_max, y_max, new_val, percent))
     print(f"\n[Apply] Changed {n} pixel(s) to {new_val} ({legend_dict[new_val]}), "
@@ -466,16 +704,18 @@ btn_apply.on_clicked(apply_changes)
 def save_changes(event):
     """Save in-memory edits of the current file to disk."""
     try:
-        landuse[:] = landuse_data
-        data.sync()
+        written = _write_dirty()
     except Exception as e:
         print(f"\n[Save] ERROR — could not write to {filename}: {e}")
         return
-    print(f"\n[Save] Saved to {filename}")
+    if written:
+        print(f"\n[Save] Saved to {filename}")
+    else:
+        print(f"\n[Save] No unsaved changes in {filename}")
 
     if applied_changes:
         args_str = ' '.join(
-            f'--apply {x},{y},{x2},{y2},{v},{p:g}'
+            f'--apply={x},{y},{x2},{y2},{v},{p:g}'
             for x, y, x2, y2, v, p in applied_changes
         )
         script = os.path.basename(sys.argv[0])
@@ -520,8 +760,8 @@ def apply_all_changes(event):
 
     # Apply to current file display (independent randomisation)
     n = _apply_region_to_array(landuse_data, x_min, y_min, x_max, y_max, new_val, percent)
-    im.set_data(landuse_data)
-    fig.canvas.draw_idle()
+    _mark_dirty(x_min, y_min, x_max, y_max)
+    redraw_image()
 
     applied_changes.append((x_min, y_min, x_max, y_max, new_val, percent))
     bulk_applied_changes.append((x_min, y_min, x_max, y_max, new_val, percent))
@@ -537,13 +777,58 @@ def apply_all_changes(event):
 btn_apply_all.on_clicked(apply_all_changes)
 
 
+def _apply_to_member(member, staged, rng):
+    """
+    Open one ensemble member's domain NC, apply every staged change with the
+    member's own generator, then save and close it.  Only the chunk-aligned
+    window covering the staged rectangles is read and written back.
+    Returns the per-change report lines.
+    """
+    lines = []
+    m_data = open_dataset(member['nc_file'], 'r+')
+    try:
+        m_lu = landuse_var(m_data)
+        n_rows, n_cols = m_lu.shape[-2], m_lu.shape[-1]
+
+        # Union of the staged rectangles, clamped to the grid
+        r0 = max(min(c[1] for c in staged), 0);  r1 = min(max(c[3] for c in staged), n_rows - 1)
+        c0 = max(min(c[0] for c in staged), 0);  c1 = min(max(c[2] for c in staged), n_cols - 1)
+        window = None
+        if r0 <= r1 and c0 <= c1:
+            r0, r1, c0, c1 = _chunk_aligned(m_lu, r0, r1, c0, c1)
+            window = m_lu[r0:r1 + 1, c0:c1 + 1]
+
+        # Disjoint rectangles go out in one scatter; overlapping ones are
+        # applied one by one so later changes win, as in the current file
+        local = [(x_min - c0, y_min - r0, x_max - c0, y_max - r0, new_val, percent)
+                 for (x_min, y_min, x_max, y_max, new_val, percent) in staged]
+        counts = None
+        if window is not None:
+            counts = _apply_staged_merged(window, local, rng=rng)
+            if counts is None:
+                counts = [_apply_region_to_array(window, *spec, rng=rng) for spec in local]
+
+        for i, (x_min, y_min, x_max, y_max, new_val, percent) in enumerate(staged):
+            n = counts[i] if counts else 0
+            lines.append(f"{n} pixel(s) -> landuse={new_val} ({legend_dict.get(new_val, '?')}), "
+                         f"region ({x_min},{y_min})-({x_max},{y_max}), {percent}%")
+
+        if window is not None:
+            m_lu[r0:r1 + 1, c0:c1 + 1] = window
+            m_data.sync()
+    finally:
+        m_data.close()
+    return lines
+
+
 def save_all_changes(event):
     """
     Commit all bulk-staged changes to every ensemble member:
       - Saves the current file to disk.
       - For every other ensemble member: opens its domain NC, applies each
         staged change with *independently* randomised pixel selection, then
-        saves and closes the file.
+        saves and closes the file.  Each member gets its own random
+        generator, seeded from the shared one.
     Each member therefore receives the same region / percentage / landuse class
     but a unique random perturbation pattern.
     """
@@ -563,52 +848,32 @@ def save_all_changes(event):
 
     # Save the currently displayed file
     try:
-        landuse[:] = landuse_data
-        data.sync()
+        _write_dirty()
     except Exception as e:
         print(f"\n[Save All] ERROR — could not write current file {os.path.basename(filename)}: {e}")
         return
     print(f"\n[Save All] Saved current file: {os.path.basename(filename)}")
 
     current_abs = os.path.abspath(filename)
+    staged = list(bulk_applied_changes)
     errors = 0
-
     for member in ensemble_members:
-        member_nc_abs = os.path.abspath(member['nc_file'])
-
-        if member_nc_abs == current_abs:
+        if os.path.abspath(member['nc_file']) == current_abs:
             # Already saved above
             print(f"[Save All] {member['in_fname']}: ✓ (current file, already saved)")
             continue
-
-        m_data = None
         try:
-            m_data = nc.Dataset(member['nc_file'], 'r+')
-            m_lu        = m_data['landuse']
-            m_lu_data   = m_lu[:]
-
-            for (x_min, y_min, x_max, y_max, new_val, percent) in bulk_applied_changes:
-                n = _apply_region_to_array(
-                    m_lu_data, x_min, y_min, x_max, y_max, new_val, percent
-                )
-                print(f"[Save All] {member['in_fname']}: "
-                      f"{n} pixel(s) -> landuse={new_val} ({legend_dict.get(new_val, '?')}), "
-                      f"region ({x_min},{y_min})-({x_max},{y_max}), {percent}%")
-
-            m_lu[:] = m_lu_data
-            m_data.sync()
-            m_data.close()
-            print(f"[Save All] {member['in_fname']}: ✓ saved successfully  "
-                  f"({member['nc_file']})")
-
+            # A fresh generator per member keeps the patterns independent
+            rng = np.random.default_rng(_rng.integers(2**63))
+            lines = _apply_to_member(member, staged, rng)
         except Exception as e:
             print(f"[Save All] {member['in_fname']}: ✗ ERROR — {e}")
             errors += 1
-            if m_data is not None:
-                try:
-                    m_data.close()
-                except Exception:
-                    pass
+            continue
+        for line in lines:
+            print(f"[Save All] {member['in_fname']}: {line}")
+        print(f"[Save All] {member['in_fname']}: ✓ saved successfully  "
+              f"({member['nc_file']})")
 
     if errors == 0:
         print(f"\n[Save All] Complete — all {len(ensemble_members)} member(s) "
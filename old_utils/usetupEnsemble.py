@@ -3,6 +3,53 @@ import sys
 import os
 import re
 
+# .in fields rewritten per member
+_FIELDS_RE = re.compile(
+    rb"(domname)\s*=\s*'([^']*)'|(dirter|dirglob)\s*=\s*'[^']*'|dirout\s*=\s*'[^']*'"
+)
+
+
+def _mkdir(path):
+    """mkdir that tolerates an existing directory: one syscall, no stat first."""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+
+
+def member_template(content):
+    """
+    Split a base .in file (bytes) into a template for the numbered members:
+    domname gets the member-number prefix and dirter/dirglob/dirout point at
+    ./<n>input and ./<n>output.  The template is the list of byte chunks
+    between the places where <n> goes, so the regex work is done once and
+    each member is just str(n).encode().join(template) — no decoding or
+    re-encoding in the member loop.
+    Returns (template, base_domname); base_domname is None if there is none.
+    """
+    template, chunk, pos, base_domname = [], [], 0, None
+
+    def cut(head, tail):
+        # Close the current chunk with `head`; the next one starts with `tail`
+        chunk.append(head)
+        template.append(b''.join(chunk))
+        chunk[:] = [tail]
+
+    for m in _FIELDS_RE.finditer(content):
+        chunk.append(content[pos:m.start()])
+        if m.group(1):
+            if base_domname is None:
+                base_domname = m.group(2).decode('utf-8')
+            cut(b"domname = '", m.group(2) + b"'")
+        elif m.group(3):
+            cut(m.group(3) + b" = './", b"input'")
+        else:
+            cut(b"dirout='./", b"output'")
+        pos = m.end()
+    chunk.append(content[pos:])
+    template.append(b''.join(chunk))
+    return template, base_domname
+
 
 def main():
     if len(sys.argv) != 3:
@@ -19,38 +66,20 @@ def main():
     base_name = os.path.basename(base_file)
     work_dir = os.getcwd()
 
-    with open(base_file, 'r') as f:
+    with open(base_file, 'rb') as f:
         content = f.read()
+    template, _ = member_template(content)
 
     for n in range(1, count + 1):
         # Create numbered input and output directories
-        os.makedirs(os.path.join(work_dir, f'{n}input'), exist_ok=True)
-        os.makedirs(os.path.join(work_dir, f'{n}output'), exist_ok=True)
+        _mkdir(os.path.join(work_dir, f'{n}input'))
+        _mkdir(os.path.join(work_dir, f'{n}output'))
 
         # Replace domname, dirter, dirglob, dirout to numbered variants
-        new_content = re.sub(
-            r"domname\s*=\s*'([^']*)'",
-            lambda m: f"domname = '{n}{m.group(1)}'",
-            content
-        )
-        new_content = re.sub(
-            r"dirter\s*=\s*'[^']*'",
-            f"dirter = './{n}input'",
-            new_content
-        )
-        new_content = re.sub(
-            r"dirglob\s*=\s*'[^']*'",
-            f"dirglob = './{n}input'",
-            new_content
-        )
-        new_content = re.sub(
-            r"dirout\s*=\s*'[^']*'",
-            f"dirout='./{n}output'",
-            new_content
-        )
+        new_content = str(n).encode().join(template)
 
         out_path = os.path.join(work_dir, f'{n}{base_name}')
-        with open(out_path, 'w') as f:
+        with open(out_path, 'wb') as f:
             f.write(new_content)
 
         print(f"Created: {n}{base_name}  {n}input/  {n}output/")
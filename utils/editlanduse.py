@@ -1,4 +1,8 @@
 import netCDF4 as nc
+try:
+    import h5netcdf.legacyapi as h5nc
+except ImportError:
+    h5nc = None
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import RectangleSelector, TextBox, Button
@@ -13,6 +17,22 @@ np.set_printoptions(threshold=500)
 ## threshold=5000
 ## threshold=np.inf
 
+_rng = np.random.default_rng()
+
+def open_dataset(path, mode='r+'):
+    """
+    Open a NetCDF file through h5netcdf when it is installed (lower per-call
+    overhead) and netCDF4 otherwise.  h5netcdf only reads NetCDF-4/HDF5
+    files, so classic-format files (or a missing h5py backend) fall back to
+    netCDF4.
+    """
+    if h5nc is not None:
+        try:
+            return h5nc.Dataset(path, mode)
+        except (OSError, ImportError):
+            pass
+    return nc.Dataset(path, mode)
+
 # Find .in file and extract domname — pick the one with the lowest numeric prefix
 in_files = glob.glob('*.in')
 if not in_files:
@@ -41,7 +61,7 @@ dirter = dirter_match.group(1) if dirter_match else './input'
 filename = os.path.join(dirter, f'{domname}_DOMAIN000.nc')
 print(f"Opening: {filename}")
 
-data = nc.Dataset(filename, 'r+')
+data = open_dataset(filename, 'r+')
 landuse = data['landuse']
 
 legend_text = landuse.getncattr('legend')
@@ -56,6 +76,11 @@ DOC_FILE = 'landuse_doc.txt'
 _apply_count = [0]
 _last_region = [None]  # stores (x_min, y_min, x_max, y_max) from last selection
 
+def _sample_indices(n_pts, n, rng=_rng):
+    """Return n distinct random indices in range(n_pts)."""
+    # shuffle=False skips permuting the result, which the caller does not need
+    return rng.choice(n_pts, n, replace=False, shuffle=False)
+
 def _log(lines):
     with open(DOC_FILE, 'a') as f:
         f.write('\n'.join(lines) + '\n')
@@ -89,7 +114,8 @@ ax.format_coord = format_coord
 
 ## Selecting points
 
-selected_points = []
+# Selected rectangle, clamped to the grid: (r0, c0, n_rows, n_cols)
+_selection = [None]
 
 def on_select(eclick, erelease):
     x1, y1 = int(round(eclick.xdata)), int(round(eclick.ydata))
@@ -98,23 +124,25 @@ def on_select(eclick, erelease):
     x_min, x_max = min(x1, x2), max(x1, x2)
     y_min, y_max = min(y1, y2), max(y1, y2)
 
-    selected_points.clear()
     _last_region[0] = (x_min, y_min, x_max, y_max)
     print(f"\nSelected region: ({x_min}, {y_min}) to ({x_max}, {y_max})")
     print("Points selected:")
-    for row in range(y_min, y_max + 1):
-        for col in range(x_min, x_max + 1):
-            if 0 <= row < landuse_data.shape[0] and 0 <= col < landuse_data.shape[1]:
-                val = int(landuse_data[row, col])
-                name = legend_dict.get(val, 'Unknown')
-                selected_points.append((row, col, val))
-
-    print(f"Total points: {len(selected_points)}")
-    values = set(p[2] for p in selected_points)
+
+    # Clamp to data bounds and slice — no Python pixel loops
+    r0 = max(y_min, 0);  r1 = min(y_max, landuse_data.shape[0] - 1)
+    c0 = max(x_min, 0);  c1 = min(x_max, landuse_data.shape[1] - 1)
+    if r0 > r1 or c0 > c1:
+        _selection[0] = None
+        print("Total points: 0")
+        return
+    _selection[0] = (r0, c0, r1 - r0 + 1, c1 - c0 + 1)
+
+    sub = landuse_data[r0:r1 + 1, c0:c1 + 1]
+    print(f"Total points: {sub.size}")
+    vals, counts = np.unique(sub, return_counts=True)
     print("Landuse types in selection:")
-    for v in sorted(values):
-        count = sum(1 for p in selected_points if p[2] == v)
-        print(f"  {v} - {legend_dict.get(v, 'Unknown')}: {count} points")
+    for v, count in zip(vals, counts):
+        print(f"  {int(v)} - {legend_dict.get(int(v), 'Unknown')}: {count} points")
 
 selector = RectangleSelector(ax, on_select, useblit=True, button=[1],
                              interactive=True)
@@ -132,7 +160,7 @@ btn_save = Button(ax_save, 'Save')
 
 def apply_changes(event):
     global landuse_data
-    if not selected_points:
+    if _selection[0] is None:
         print("No points selected!")
         return
 
@@ -151,12 +179,19 @@ def apply_changes(event):
         print("Percent must be between 0 and 100.")
         return
 
-    num_to_change = int(len(selected_points) * percent / 100)
-    points_to_change = np.random.choice(len(selected_points), num_to_change, replace=False)
+    r0, c0, h, w = _selection[0]
+    total = h * w
+    # Breakdown of the region before this edit, for the log
+    orig_vals, orig_counts = np.unique(landuse_data[r0:r0 + h, c0:c0 + w], return_counts=True)
 
-    for idx in points_to_change:
-        row, col, _ = selected_points[idx]
-        landuse_data[row, col] = new_val
+    num_to_change = int(total * percent / 100)
+    if num_to_change == total:
+        # Whole rectangle: a plain slice fill, no random indices needed
+        landuse_data[r0:r0 + h, c0:c0 + w] = new_val
+    elif num_to_change:
+        flat = _sample_indices(total, num_to_change)
+        rows, cols = np.divmod(flat, w)
+        landuse_data[r0 + rows, c0 + cols] = new_val
 
     im.set_data(landuse_data)
     fig.canvas.draw_idle()
@@ -165,13 +200,11 @@ def apply_changes(event):
 
     _apply_count[0] += 1
     ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    total = len(selected_points)
     region = _last_region[0]
     region_str = f'({region[0]}, {region[1]}) to ({region[2]}, {region[3]})' if region else 'unknown'
-    orig_values = set(p[2] for p in selected_points)
     orig_breakdown = [
-        f'      {v:3d} - {legend_dict.get(v, "Unknown"):30s}: {sum(1 for p in selected_points if p[2] == v):6d} pts  ({100 * sum(1 for p in selected_points if p[2] == v) / total:.1f}%)'
-        for v in sorted(orig_values)
+        f'      {v:3d} - {legend_dict.get(v, "Unknown"):30s}: {cnt:6d} pts  ({100 * cnt / total:.1f}%)'
+        for v, cnt in zip(orig_vals.astype(int).tolist(), orig_counts.tolist())
     ]
     _log(
         [f'',
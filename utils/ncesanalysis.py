@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 import os
 import re
+import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 def main():
@@ -38,20 +40,48 @@ def main():
     print(f"Base name: {base_name}")
     print(f"Dates: {', '.join(dates)}\n")
 
-    for date in dates:
+    # `module load` only edits the environment, so do it once and run nces
+    # directly with the captured environment instead of a shell per date
+    try:
+        env_out = subprocess.run(
+            ['bash', '-c', 'module load nco && env -0'],
+            stdout=subprocess.PIPE, check=True,
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        print(f"Error: module load nco failed (exit {e.returncode})")
+        sys.exit(e.returncode)
+    nco_env = dict(
+        entry.split('=', 1)
+        for entry in env_out.decode().split('\0') if '=' in entry
+    )
+    if shutil.which('nces', path=nco_env.get('PATH')) is None:
+        print("Error: nces not found on PATH after 'module load nco'")
+        sys.exit(127)
+
+    def run_nces(date):
         inputs = [
             os.path.join(parent_dir, f'{n}output', f'{n}{base_name}_SRF.{date}.nc')
             for n in range(1, count + 1)
         ]
         output = f'nces_{date}.nc'
 
-        cmd_str = f"module load nco && nces {' '.join(inputs)} {output}"
-        print(f"Running: {cmd_str}")
-        result = subprocess.run(cmd_str, shell=True, executable='/bin/bash')
-        if result.returncode != 0:
-            print(f"Error: nces failed for date {date} (exit {result.returncode})")
-            sys.exit(result.returncode)
-        print(f"Created: {output}\n")
+        cmd = ['nces', *inputs, output]
+        print(f"Running: {' '.join(cmd)}")
+        result = subprocess.run(cmd, env=nco_env)
+        return date, output, result.returncode
+
+    # Each date writes its own output, so the nces calls are independent;
+    # threads are enough since they only wait on the child processes
+    with ThreadPoolExecutor(max_workers=min(4, len(dates))) as pool:
+        futures = [pool.submit(run_nces, date) for date in dates]
+        for fut in as_completed(futures):
+            date, output, returncode = fut.result()
+            if returncode != 0:
+                print(f"Error: nces failed for date {date} (exit {returncode})")
+                for f in futures:
+                    f.cancel()
+                sys.exit(returncode)
+            print(f"Created: {output}\n")
 
     print(f"Done. {len(dates)} file(s) written to analysis/.")
 
@@ -1,38 +1,92 @@
 import os
 import shutil
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_SRC = "/N/u/earuland/Quartz/thindrives/climateRe/basefiles"
 UTILS_SRC = "/N/u/earuland/Quartz/thindrives/climateRe/utils"
 
+ENV_SH = """\
+# Source once per shell before running the ensemble scripts:  source env.sh
+module use /N/slate/obrienta/software/quartz/modulefiles
+module load regcm
+module load conda
+conda activate /N/slate/$USER/conda_envs/easg690
+"""
+
+
+def _mkdir(path):
+    """mkdir that tolerates an existing directory: one syscall, no stat first."""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+
+
+def _copy_file(src, dst_dir):
+    """
+    shutil.copy(src, dst_dir) through an in-kernel os.copy_file_range where
+    available.  These are real copies, not hardlinks: the .in file, header
+    and scripts get edited per run directory.
+    """
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if sent == 0:
+                    break
+                remaining -= sent
+        shutil.copymode(src, dst)
+    except (AttributeError, OSError):
+        shutil.copy(src, dst)
+
 
 def setup_edit_dir(dest, name):
+    """Create an edit run directory; return the (src, dst_dir) copies it needs."""
     edit_dir = os.path.join(dest, name)
-    os.makedirs(os.path.join(edit_dir, "analysis"), exist_ok=True)
-    shutil.copy(os.path.join(UTILS_SRC, "ueditsetupEnsemble.py"), edit_dir)
-    shutil.copy(os.path.join(UTILS_SRC, "ncesanalysis.py"), os.path.join(edit_dir, "analysis"))
+    _mkdir(edit_dir)
+    _mkdir(os.path.join(edit_dir, "analysis"))
+    return [
+        (os.path.join(UTILS_SRC, "ueditsetupEnsemble.py"), edit_dir),
+        (os.path.join(UTILS_SRC, "ncesanalysis.py"), os.path.join(edit_dir, "analysis")),
+    ]
 
 
 def setupdir(dest, num_edits=1):
     os.makedirs(dest, exist_ok=True)
 
-    shutil.copy(os.path.join(BASE_SRC, "btown_000.in"), dest)
-    shutil.copy(os.path.join(BASE_SRC, "header.sbatch"), dest)
+    copies = [
+        (os.path.join(BASE_SRC, "btown_000.in"), dest),
+        (os.path.join(BASE_SRC, "header.sbatch"), dest),
+    ]
 
     base_dir = os.path.join(dest, "base")
-    os.makedirs(os.path.join(base_dir, "analysis"), exist_ok=True)
-    shutil.copy(os.path.join(UTILS_SRC, "ubasesetupEnsemble.py"), base_dir)
-    shutil.copy(os.path.join(UTILS_SRC, "ncesanalysis.py"), os.path.join(base_dir, "analysis"))
+    _mkdir(base_dir)
+    _mkdir(os.path.join(base_dir, "analysis"))
+    copies += [
+        (os.path.join(UTILS_SRC, "ubasesetupEnsemble.py"), base_dir),
+        (os.path.join(UTILS_SRC, "ncesanalysis.py"), os.path.join(base_dir, "analysis")),
+    ]
 
     if num_edits == 1:
-        setup_edit_dir(dest, "edit")
+        copies += setup_edit_dir(dest, "edit")
         edit_labels = ["edit"]
     else:
         for i in range(1, num_edits + 1):
-            setup_edit_dir(dest, f"{i}edit")
+            copies += setup_edit_dir(dest, f"{i}edit")
         edit_labels = [f"{i}edit" for i in range(1, num_edits + 1)]
 
+    # Directories exist now; the copies are independent of each other
+    with ThreadPoolExecutor(max_workers=min(8, len(copies))) as pool:
+        list(pool.map(lambda c: _copy_file(*c), copies))
+
+    # Module loads only affect the shell that runs them, so leave a file to
+    # source once instead of loading them from here
+    with open(os.path.join(dest, "env.sh"), "w") as f:
+        f.write(ENV_SH)
+
     changes_path = os.path.join(dest, "edit_doc.txt")
     with open(changes_path, "w") as f:
         f.write("base:\n")
@@ -41,19 +95,9 @@ def setupdir(dest, num_edits=1):
 
 
 if __name__ == '__main__':
-    subprocess.run(
-        'module use /N/slate/obrienta/software/quartz/modulefiles && module load regcm',
-        shell=True,
-        executable='/bin/bash'
-    )
-    subprocess.run(
-        'module load conda && conda activate /N/slate/$USER/conda_envs/easg690',
-        shell=True,
-        executable='/bin/bash'
-    )
-
     num_edits = 1
     if len(sys.argv) > 1:
         num_edits = int(sys.argv[1])
 
     setupdir(os.getcwd(), num_edits)
+    print("Run 'source env.sh' to load regcm and the conda environment.")
@@ -4,23 +4,121 @@ import os
 import re
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+ARRAY_SBATCH = 'batch.sbatch'
+FANOUT_LOG   = 'fanout.log'
 
-def write_sbatch(work_dir, base_name, count):
-    """Generate individual #batch.sbatch files for each ensemble member."""
-    template_path = os.path.join(work_dir, '..', 'header.sbatch')
-    srun_prefix = "srun -n 64 regcmMPI"
+# .in fields rewritten per member, header srun line
+_FIELDS_RE = re.compile(
+    rb"(domname)\s*=\s*'([^']*)'|(dirter|dirglob)\s*=\s*'[^']*'|dirout\s*=\s*'[^']*'"
+)
+_SRUN_RE   = re.compile(r'\s*srun\b')
+
+
+def _mkdir(path):
+    """mkdir that tolerates an existing directory: one syscall, no stat first."""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+
+
+def member_template(content):
+    """
+    Split a base .in file (bytes) into a template for the numbered members:
+    domname gets the member-number prefix and dirter/dirglob/dirout point at
+    ./<n>input and ./<n>output.  The template is the list of byte chunks
+    between the places where <n> goes, so the regex work is done once and
+    each member is just str(n).encode().join(template) — no decoding or
+    re-encoding in the member loop.
+    Returns (template, base_domname); base_domname is None if there is none.
+    """
+    template, chunk, pos, base_domname = [], [], 0, None
+
+    def cut(head, tail):
+        # Close the current chunk with `head`; the next one starts with `tail`
+        chunk.append(head)
+        template.append(b''.join(chunk))
+        chunk[:] = [tail]
+
+    for m in _FIELDS_RE.finditer(content):
+        chunk.append(content[pos:m.start()])
+        if m.group(1):
+            if base_domname is None:
+                base_domname = m.group(2).decode('utf-8')
+            cut(b"domname = '", m.group(2) + b"'")
+        elif m.group(3):
+            cut(m.group(3) + b" = './", b"input'")
+        else:
+            cut(b"dirout='./", b"output'")
+        pos = m.end()
+    chunk.append(content[pos:])
+    template.append(b''.join(chunk))
+    return template, base_domname
+
+
+def _fast_clone(src, dst, link=True):
+    """
+    Clone src to dst: a hardlink when `link` is set, else an in-kernel
+    os.copy_file_range (reflink / server-side copy where the filesystem
+    supports it), else os.sendfile in 1 MiB chunks, else shutil.copyfile.
+    Only the data is copied: members don't need the source's mode or times.
+    """
+    # Never write through an existing dst: it may be a hardlink to src
+    try:
+        os.unlink(dst)
+    except FileNotFoundError:
+        pass
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if sent == 0:
+                    break
+                remaining -= sent
+        return
+    except (AttributeError, OSError):
+        pass
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            size, offset = os.fstat(fsrc.fileno()).st_size, 0
+            while offset < size:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, min(size - offset, 1 << 20))
+                if sent == 0:
+                    break
+                offset += sent
+        return
+    except OSError:
+        pass
+    shutil.copyfile(src, dst)
 
-    if os.path.isfile(template_path):
+
+def _parse_header(path):
+    """
+    Split a header.sbatch template at its srun line.  Returns
+    (header_prefix, srun_prefix): the encoded text every member's batch file
+    starts with, and the srun command the member's .in file is appended to.
+    Falls back to the default Quartz header when the template is missing.
+    """
+    srun_prefix = "srun -n 64 regcmMPI"
+    try:
         header_lines = []
-        with open(template_path, 'r') as f:
+        with open(path, 'r') as f:
             for line in f:
                 stripped = line.rstrip()
-                if re.match(r'\s*srun\b', stripped):
+                if _SRUN_RE.match(stripped):
                     srun_prefix = stripped
                     break
                 header_lines.append(stripped)
-    else:
+    except FileNotFoundError:
         header_lines = [
             "#!/bin/bash",
             "#SBATCH -A r00389",
@@ -33,25 +131,60 @@ def write_sbatch(work_dir, base_name, count):
             "module use /N/slate/obrienta/software/quartz/modulefiles",
             "module load regcm",
         ]
+    return '\n'.join(header_lines + ["", ""]).encode('utf-8'), srun_prefix
 
+
+def write_sbatch(work_dir, base_name, count):
+    """
+    Generate individual #batch.sbatch files for each ensemble member, plus a
+    single batch.sbatch job-array script that runs member $SLURM_ARRAY_TASK_ID.
+    """
+    header_prefix, srun_prefix = _parse_header(os.path.join(work_dir, '..', 'header.sbatch'))
     for n in range(1, count + 1):
-        individual_lines = header_lines + ["", f"{srun_prefix} {n}{base_name}", ""]
         out_path = os.path.join(work_dir, f"{n}batch.sbatch")
-        with open(out_path, 'w') as f:
-            f.write('\n'.join(individual_lines))
+        with open(out_path, 'wb') as f:
+            f.write(header_prefix + f"{srun_prefix} {n}{base_name}\n".encode('utf-8'))
         print(f"Created: {n}batch.sbatch")
 
+    with open(os.path.join(work_dir, ARRAY_SBATCH), 'wb') as f:
+        f.write(header_prefix + f"{srun_prefix} ${{SLURM_ARRAY_TASK_ID}}{base_name}\n".encode('utf-8'))
+    print(f"Created: {ARRAY_SBATCH}")
+
+
+def _batch_number(fname):
+    """Member number of an <n>batch.sbatch file name, or None for any other name."""
+    if fname.endswith('batch.sbatch'):
+        stem = fname[:-len('batch.sbatch')]
+        if stem.isdecimal():
+            return int(stem)
+    return None
+
 
-def submit_sbatch(work_dir):
-    """Submit all *batch.sbatch files in numeric order."""
-    sbatch_files = sorted(
-        [f for f in os.listdir(work_dir) if re.match(r'^\d+batch\.sbatch$', f)],
-        key=lambda f: int(re.match(r'^(\d+)', f).group(1))
-    )
+def submit_sbatch(work_dir, legacy=False):
+    """
+    Submit every member as one Slurm job array over batch.sbatch (a single
+    controller round-trip), with the array indices taken from the
+    <n>batch.sbatch files present.  With `legacy`, or in a run directory
+    without batch.sbatch, submit the *batch.sbatch files one by one in
+    numeric order instead.
+    """
+    items = sorted((n, f) for f in os.listdir(work_dir) if (n := _batch_number(f)) is not None)
+    sbatch_files = [f for _, f in items]
     if not sbatch_files:
         print("Error: no *batch.sbatch files found in current directory.")
         sys.exit(1)
 
+    if not legacy and os.path.isfile(os.path.join(work_dir, ARRAY_SBATCH)):
+        indices = ','.join(str(n) for n, _ in items)
+        print(f"Submitting {len(sbatch_files)} job(s) as array {indices}...")
+        result = subprocess.run(['sbatch', f'--array={indices}', ARRAY_SBATCH],
+                                cwd=work_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"Error submitting {ARRAY_SBATCH}: {result.stderr.strip()}")
+            sys.exit(result.returncode)
+        print(f"  {ARRAY_SBATCH}: {result.stdout.strip()}")
+        return
+
     print(f"Submitting {len(sbatch_files)} job(s)...")
     for fname in sbatch_files:
         result = subprocess.run(['sbatch', fname], cwd=work_dir, capture_output=True, text=True)
@@ -73,14 +206,14 @@ def run_cmd(cmd, cwd):
 def main():
     work_dir = os.getcwd()
 
-    if len(sys.argv) == 2 and sys.argv[1] == 'sbatch':
-        submit_sbatch(work_dir)
+    if sys.argv[1:2] == ['sbatch'] and sys.argv[2:] in ([], ['--legacy']):
+        submit_sbatch(work_dir, legacy='--legacy' in sys.argv[2:])
         return
 
     if len(sys.argv) != 3:
         print("Usage:")
         print(f"  python3 {os.path.basename(sys.argv[0])} <base_file> <count>   # setup + run all preprocessing")
-        print(f"  python3 {os.path.basename(sys.argv[0])} sbatch                 # submit all batch jobs")
+        print(f"  python3 {os.path.basename(sys.argv[0])} sbatch [--legacy]      # submit all batch jobs (one job array)")
         sys.exit(1)
 
     base_file = sys.argv[1]
@@ -92,49 +225,34 @@ def main():
 
     base_name = os.path.basename(base_file)
 
-    with open(base_file, 'r') as f:
+    with open(base_file, 'rb') as f:
         content = f.read()
+    template, base_domname = member_template(content)
+    if base_domname is None:
+        print(f"Error: no domname found in {base_file}")
+        sys.exit(1)
 
     for n in range(1, count + 1):
         # Create numbered input and output directories
-        os.makedirs(os.path.join(work_dir, f'{n}input'), exist_ok=True)
-        os.makedirs(os.path.join(work_dir, f'{n}output'), exist_ok=True)
+        _mkdir(os.path.join(work_dir, f'{n}input'))
+        _mkdir(os.path.join(work_dir, f'{n}output'))
 
         # Replace domname, dirter, dirglob, dirout to numbered variants
-        new_content = re.sub(
-            r"domname\s*=\s*'([^']*)'",
-            lambda m: f"domname = '{n}{m.group(1)}'",
-            content
-        )
-        new_content = re.sub(
-            r"dirter\s*=\s*'[^']*'",
-            f"dirter = './{n}input'",
-            new_content
-        )
-        new_content = re.sub(
-            r"dirglob\s*=\s*'[^']*'",
-            f"dirglob = './{n}input'",
-            new_content
-        )
-        new_content = re.sub(
-            r"dirout\s*=\s*'[^']*'",
-            f"dirout='./{n}output'",
-            new_content
-        )
+        new_content = str(n).encode().join(template)
 
         out_path = os.path.join(work_dir, f'{n}{base_name}')
-        with open(out_path, 'w') as f:
+        with open(out_path, 'wb') as f:
             f.write(new_content)
 
         print(f"Created: {n}{base_name}  {n}input/  {n}output/")
 
-    # Parse the base domname to know what prefix terrain/sst/icbc will use
-    base_domname = re.search(r"domname\s*=\s*'([^']*)'", content).group(1)
     m1_in_file = f"1{base_name}"
     m1_domname = f"1{base_domname}"
     m1_input_dir = os.path.join(work_dir, "1input")
 
-    # Run terrain, sst, icbc sequentially for member 1
+    # Run terrain, sst, icbc sequentially for member 1.  This is a true chain,
+    # not just convention: sst reads the DOMAIN file terrain writes, and icbc
+    # reads the <domname>_SST.nc that sst writes, so none of them can overlap.
     print(f"\nRunning preprocessing for member 1 ({m1_in_file})...")
     for cmd_name in ["terrain", "sst", "icbc"]:
         run_cmd([cmd_name, m1_in_file], work_dir)
@@ -142,15 +260,35 @@ def main():
     # Copy and rename files from 1input to {n}input for members 2..count
     if count > 1:
         print(f"\nCopying input files from 1input to members 2-{count}...")
-        src_files = os.listdir(m1_input_dir)
-        for n in range(2, count + 1):
-            m_domname = f"{n}{base_domname}"
-            m_input_dir = os.path.join(work_dir, f"{n}input")
-            for fname in src_files:
-                src = os.path.join(m1_input_dir, fname)
-                new_fname = m_domname + fname[len(m1_domname):] if fname.startswith(m1_domname) else fname
-                shutil.copy2(src, os.path.join(m_input_dir, new_fname))
-                print(f"  {n}input/{new_fname}")
+        # Inode order approximates on-disk order, so the pool's reads stay
+        # close to sequential; every member's clone of a file is queued
+        # together while that source is still in the page cache.  scandir
+        # returns inode and file type from the directory read itself.
+        with os.scandir(m1_input_dir) as it:
+            src_entries = sorted((e for e in it if e.is_file()),
+                                 key=lambda e: e.inode())
+        # Per member: (domname prefix, input dir); per file: the part after
+        # the member-1 domname, or None for files that keep their name
+        members = [(f"{n}{base_domname}", os.path.join(work_dir, f"{n}input"))
+                   for n in range(2, count + 1)]
+        tasks = []
+        for entry in src_entries:
+            src, fname = entry.path, entry.name
+            suffix = fname[len(m1_domname):] if fname.startswith(m1_domname) else None
+            for m_domname, m_input_dir in members:
+                new_fname = fname if suffix is None else m_domname + suffix
+                tasks.append((src, os.path.join(m_input_dir, new_fname)))
+
+        # The (member, file) clones are independent: overlap their metadata
+        # round-trips on the shared filesystem. Real copies, not hardlinks:
+        # the landuse editors rewrite a member's DOMAIN file in place.
+        if tasks:
+            with ThreadPoolExecutor(max_workers=min(32, len(tasks))) as pool:
+                list(pool.map(lambda t: _fast_clone(*t, link=False), tasks))
+        # One summary line; the full file list goes to a log in one write
+        with open(os.path.join(work_dir, FANOUT_LOG), 'w') as f:
+            f.writelines(f"{os.path.relpath(dst, work_dir)}\n" for _, dst in tasks)
+        print(f"  Fanned out {len(src_entries)} file(s) x {count - 1} member(s)  (list: {FANOUT_LOG})")
 
     # Generate individual batch sbatch files for each ensemble member
     write_sbatch(work_dir, base_name, count)